@@ -1,4 +1,5 @@
 import sys
+from concurrent.futures import ThreadPoolExecutor, wait
 import cv2
 import numpy as np
 
@@ -8,103 +9,250 @@ from PySide6.QtWidgets import (
     QPushButton, QLabel, QFileDialog, QMessageBox
 )
 from PySide6.QtGui import QPixmap, QImage
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QObject, QThread, Signal, Slot
 
 # FUNÇÕES DE DETECÇÃO REESCRITAS E OTIMIZADAS
 
-def detectar_desmatamento(imagem):
-    """Detecta solo exposto (marrom/ocre)."""
-    hsv = cv2.cvtColor(imagem, cv2.COLOR_BGR2HSV)
+def obter_buffer(buffers, nome, shape):
+    """
+    Devolve o buffer uint8 `nome` guardado em `buffers`, realocando apenas quando
+    o formato da imagem muda. Sem dicionário de buffers, devolve None e as
+    funções do OpenCV alocam a saída normalmente.
+    """
+    if buffers is None:
+        return None
+    buffer = buffers.get(nome)
+    if buffer is None or buffer.shape != shape:
+        buffer = np.empty(shape, np.uint8)
+        buffers[nome] = buffer
+    return buffer
+
+
+# Menor lado, em pixels, usado como referência para reduzir a imagem antes da
+# detecção de desmatamento. O fator fica limitado a ESCALA_MAXIMA: acima disso
+# a área detectada se afasta da obtida em resolução cheia.
+RESOLUCAO_TRABALHO = 720
+ESCALA_MAXIMA = 2
+
+
+def tamanho_kernel(escala):
+    """
+    Lado (ímpar) do kernel que, na imagem reduzida por `escala`, cobre
+    aproximadamente a mesma região que o 5x5 em resolução cheia.
+    """
+    return max(1, 5 // escala) | 1
+
+
+# Com escala maior, o kernel derivado degeneraria para 1x1 (sem limpeza)
+assert tamanho_kernel(ESCALA_MAXIMA) >= 3
+
+
+def reduzir_imagem(imagem, buffers=None):
+    """
+    Reduz a imagem por um fator inteiro (até ESCALA_MAXIMA) para que a detecção
+    rode perto de RESOLUCAO_TRABALHO. Devolve (imagem_reduzida, escala); com
+    escala 1 a própria imagem é devolvida.
+    """
+    escala = min(ESCALA_MAXIMA, max(1, min(imagem.shape[:2]) // RESOLUCAO_TRABALHO))
+    if escala == 1:
+        return imagem, 1
+    altura, largura = imagem.shape[0] // escala, imagem.shape[1] // escala
+    reduzida = cv2.resize(imagem, (largura, altura), dst=obter_buffer(buffers, 'reduzida', (altura, largura, 3)),
+                          interpolation=cv2.INTER_AREA)
+    return reduzida, escala
+
+
+# Elementos estruturantes retangulares, criados uma única vez na importação do
+# módulo para cada tamanho usado (5 em resolução cheia, tamanho_kernel(escala)
+# na imagem reduzida). Kernels MORPH_RECT já são aplicados pelo OpenCV de forma
+# separável (linha + coluna), então não há ganho em decompô-los à mão em 1xN e Nx1.
+KERNELS = {
+    tamanho: cv2.getStructuringElement(cv2.MORPH_RECT, (tamanho, tamanho))
+    for tamanho in {5} | {tamanho_kernel(e) for e in range(1, ESCALA_MAXIMA + 1)}
+}
+KERNEL_5 = KERNELS[5]
+
+
+def extrair_regioes(mascara, escala, area_minima):
+    """
+    Encontra os contornos externos da máscara e devolve, já na resolução
+    original, as regiões (x, y, w, h, area) com área acima de area_minima.
+    """
+    contornos, _ = cv2.findContours(mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    regioes = []
+    for contorno in contornos:
+        # Área e caixa voltam para a resolução original antes de filtrar
+        area = cv2.contourArea(contorno) * escala**2
+        if area > area_minima:
+            x, y, w, h = (v * escala for v in cv2.boundingRect(contorno))
+            regioes.append((x, y, w, h, area))
+    return regioes
+
+
+def desenhar_regioes(imagem, regioes, cor, texto):
+    """Devolve uma cópia da imagem com a caixa e o texto de cada região (x, y, w, h, area)."""
+    imagem_resultado = imagem.copy()
+    for x, y, w, h, _ in regioes:
+        cv2.rectangle(imagem_resultado, (x, y), (x+w, y+h), cor, 2)
+        cv2.putText(imagem_resultado, texto, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, cor, 2)
+    return imagem_resultado
+
+
+def detectar_desmatamento(imagem, buffers=None):
+    """
+    Detecta solo exposto (marrom/ocre).
+    `buffers` é um dicionário opcional de buffers de trabalho reaproveitados
+    entre chamadas (ver obter_buffer).
+    """
+    reduzida, escala = reduzir_imagem(imagem, buffers)
+    hsv = cv2.cvtColor(reduzida, cv2.COLOR_BGR2HSV, dst=obter_buffer(buffers, 'hsv', reduzida.shape))
     
     # Faixa de cor para solo (marrom/ocre/areia)
     lower_solo = np.array([10, 40, 40])
     upper_solo = np.array([30, 255, 255])
-    mascara_solo = cv2.inRange(hsv, lower_solo, upper_solo)
+    mascara_solo = cv2.inRange(hsv, lower_solo, upper_solo, dst=obter_buffer(buffers, 'mascara', reduzida.shape[:2]))
     
-    kernel = np.ones((5,5), np.uint8)
-    mascara_solo = cv2.morphologyEx(mascara_solo, cv2.MORPH_OPEN, kernel)
-    mascara_solo = cv2.morphologyEx(mascara_solo, cv2.MORPH_CLOSE, kernel)
+    # Abertura seguida de fechamento = erosão -> dilatação -> dilatação -> erosão.
+    # As duas dilatações com o mesmo kernel viram uma só (iterations=2), e tudo
+    # é feito in-place na máscara.
+    kernel = KERNELS[tamanho_kernel(escala)]
+    mascara_solo = cv2.erode(mascara_solo, kernel, dst=mascara_solo)
+    mascara_solo = cv2.dilate(mascara_solo, kernel, dst=mascara_solo, iterations=2)
+    mascara_solo = cv2.erode(mascara_solo, kernel, dst=mascara_solo)
     
-    contornos, _ = cv2.findContours(mascara_solo, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    regioes = extrair_regioes(mascara_solo, escala, 500)
     
-    imagem_resultado = imagem.copy()
-    area_total_desmatada = 0
-    for contorno in contornos:
-        area = cv2.contourArea(contorno)
-        if area > 500:
-            x, y, w, h = cv2.boundingRect(contorno)
-            cv2.rectangle(imagem_resultado, (x, y), (x+w, y+h), (0, 255, 255), 2)
-            cv2.putText(imagem_resultado, 'Desmatamento', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-            area_total_desmatada += area
+    imagem_resultado = desenhar_regioes(imagem, regioes, (0, 255, 255), 'Desmatamento')
+    area_total_desmatada = sum(area for *_, area in regioes)
             
     # Função agora retorna apenas 2 valores, como no original
     return imagem_resultado, area_total_desmatada
 
 
-def detectar_focos_incendio(imagem):
+# Limiares de fogo no espaço HSV (matiz em 0-180 no OpenCV)
+FOGO_HUE_MAX = 20       # Faixa 1: vermelhos (0-20)
+FOGO_HUE_MIN = 170      # Faixa 2: vermelhos do outro lado do círculo (170-180)
+MIN_BRIGHTNESS = 215    # Brilho mínimo; chave para detectar fogo "branco estourado"
+
+
+def calcular_mascara_fogo(h, v, out=None, temp=None):
+    """
+    Gera a máscara de fogo (0/255) a partir dos canais H e V (contíguos) da
+    imagem HSV. Equivale a (inRange(matiz 1) | inRange(matiz 2)) & inRange(brilho),
+    mas as faixas de S e V do inRange original não restringiam nada, então cada
+    faixa vira uma limiarização escalar (cv2.threshold) sobre um único canal.
+    cv2.threshold é usado no lugar de cv2.compare porque este interpreta o
+    limiar como array quando o canal tem 1x1 pixel. Os canais são uint8, então
+    "> limiar - 1" equivale a ">= limiar".
+    """
+    _, mascara = cv2.threshold(h, FOGO_HUE_MAX, 255, cv2.THRESH_BINARY_INV, dst=out)   # h <= 20
+    _, faixa = cv2.threshold(h, FOGO_HUE_MIN - 1, 255, cv2.THRESH_BINARY, dst=temp)    # h >= 170
+    cv2.bitwise_or(mascara, faixa, dst=mascara)
+    _, faixa = cv2.threshold(v, MIN_BRIGHTNESS - 1, 255, cv2.THRESH_BINARY, dst=temp)  # v >= 215
+    cv2.bitwise_and(mascara, faixa, dst=mascara)
+    return mascara
+
+
+def detectar_focos_incendio(imagem, buffers=None):
     """
     Detecta focos de incêndio com uma lógica mais robusta para brilho extremo.
     A nova regra é: um pixel é fogo se estiver na faixa de matiz (Hue) correta
     E tiver um brilho (Value) muito alto, independentemente da saturação.
+    `buffers` tem o mesmo papel que em detectar_desmatamento.
     """
-    blurred = cv2.GaussianBlur(imagem, (5, 5), 0)
-    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+    # Roda sempre em resolução cheia: o limiar de área dos focos (30 pixels) é
+    # pequeno demais para sobreviver à redução da imagem.
+    suavizada = cv2.GaussianBlur(imagem, (5, 5), 0, dst=obter_buffer(buffers, 'suavizada', imagem.shape))
 
-    # 1. Definir a faixa de MATIZ (HUE) para vermelho/laranja/amarelo
-    # Faixa 1: para vermelhos (0-20)
-    lower_hue1 = np.array([0, 0, 0])
-    upper_hue1 = np.array([20, 255, 255])
-    mask_hue1 = cv2.inRange(hsv, lower_hue1, upper_hue1)
-    
-    # Faixa 2: para vermelhos do outro lado do círculo de cores (170-180)
-    lower_hue2 = np.array([170, 0, 0])
-    upper_hue2 = np.array([180, 255, 255])
-    mask_hue2 = cv2.inRange(hsv, lower_hue2, upper_hue2)
-
-    mask_hue = cv2.bitwise_or(mask_hue1, mask_hue2)
+    # O brilho (V) do HSV é o maior valor entre B, G e R. Se nenhum pixel atinge
+    # o limiar já em BGR, não há fogo possível e a conversão para HSV é pulada.
+    if suavizada.max() < MIN_BRIGHTNESS:
+        return imagem.copy(), 0
 
-    # 2. Definir a faixa de BRILHO (VALUE)
-    # Apenas pixels com brilho acima de um limiar alto são considerados.
-    # Este é o passo chave para detectar fogo "branco estourado".
-    MIN_BRIGHTNESS = 215
-    lower_val = np.array([0, 0, MIN_BRIGHTNESS])
-    upper_val = np.array([180, 255, 255])
-    mask_val = cv2.inRange(hsv, lower_val, upper_val)
+    hsv = cv2.cvtColor(suavizada, cv2.COLOR_BGR2HSV, dst=obter_buffer(buffers, 'hsv', imagem.shape))
 
-    # 3. Combinar as máscaras
-    # Um pixel deve satisfazer AMBAS as condições: ter a cor certa E ser muito brilhante.
-    mascara_final = cv2.bitwise_and(mask_hue, mask_val)
+    # 1-3. Máscara de fogo: matiz vermelho/laranja/amarelo (0-20 ou 170-180)
+    # E brilho muito alto, combinados na própria máscara com um buffer auxiliar.
+    # Só H e V entram nas regras; extraí-los como planos contíguos evita que as
+    # comparações percorram o canal S intercalado.
+    h = cv2.extractChannel(hsv, 0, dst=obter_buffer(buffers, 'h', imagem.shape[:2]))
+    v = cv2.extractChannel(hsv, 2, dst=obter_buffer(buffers, 'v', imagem.shape[:2]))
+    temp = obter_buffer(buffers, 'temp', imagem.shape[:2])
+    mascara_final = calcular_mascara_fogo(h, v, out=obter_buffer(buffers, 'mascara', imagem.shape[:2]), temp=temp)
 
     # 4. Limpeza morfológica
-    kernel = np.ones((5,5), np.uint8)
-    mascara_final = cv2.morphologyEx(mascara_final, cv2.MORPH_OPEN, kernel)
-    mascara_final = cv2.morphologyEx(mascara_final, cv2.MORPH_DILATE, kernel) # Dilatar para juntar focos próximos
+    mascara_final = cv2.morphologyEx(mascara_final, cv2.MORPH_OPEN, KERNEL_5, dst=mascara_final)
+    mascara_final = cv2.dilate(mascara_final, KERNEL_5, dst=mascara_final) # Dilatar para juntar focos próximos
 
     # 5. Encontrar e filtrar contornos
-    contornos, _ = cv2.findContours(mascara_final, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    imagem_resultado = imagem.copy()
-    focos_encontrados = 0
     MIN_AREA = 30 # Limiar de área pequeno para pegar focos menores
+    focos = extrair_regioes(mascara_final, 1, MIN_AREA)
 
-    for contorno in contornos:
-        if cv2.contourArea(contorno) > MIN_AREA:
-            focos_encontrados += 1
-            x, y, w, h = cv2.boundingRect(contorno)
-            cv2.rectangle(imagem_resultado, (x, y), (x+w, y+h), (0, 0, 255), 2)
-            cv2.putText(imagem_resultado, 'Foco de Incendio', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    imagem_resultado = desenhar_regioes(imagem, focos, (0, 0, 255), 'Foco de Incendio')
+    focos_encontrados = len(focos)
 
     return imagem_resultado, focos_encontrados
 
 
+# ==============================================================================
+# PROCESSAMENTO EM SEGUNDO PLANO
+# ==============================================================================
+class DetectionWorker(QObject):
+    """
+    Executa os dois detectores fora da thread da interface,
+    para que a janela continue respondendo durante o processamento.
+    Os resultados são arrays do OpenCV; a conversão para QPixmap fica a cargo da
+    interface, pois QPixmap só pode ser criado na thread principal.
+    """
+    finished = Signal(object, float, object, int)
+    erro = Signal(str)
+
+    def __init__(self):
+        super().__init__()
+        # Buffers de trabalho reaproveitados entre processamentos (um por detector)
+        self.buffers_desmatamento = {}
+        self.buffers_incendio = {}
+        # Os dois detectores são independentes e passam quase todo o tempo em
+        # funções do OpenCV que liberam o GIL, então rodam em paralelo. O OpenCV
+        # fica limitado a 2 threads para não disputar núcleos com o pool.
+        cv2.setNumThreads(2)
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    @Slot(object)
+    def run(self, imagem_original):
+        # Os detectores só leem a imagem original (cada um desenha na sua própria
+        # cópia), então ela é compartilhada entre as duas threads sem copiar.
+        futuro_desmatamento = self.executor.submit(detectar_desmatamento, imagem_original, self.buffers_desmatamento)
+        futuro_incendio = self.executor.submit(detectar_focos_incendio, imagem_original, self.buffers_incendio)
+        # Espera os dois terminarem antes de ler qualquer resultado: se um falhar,
+        # o outro não pode continuar escrevendo nos buffers enquanto a interface
+        # já liberou um novo processamento.
+        futuros = [futuro_desmatamento, futuro_incendio]
+        wait(futuros)
+        for futuro in futuros:
+            if futuro.exception() is not None:
+                # Sem este aviso a interface ficaria com os botões desabilitados
+                self.erro.emit(f"Falha ao processar a imagem:\n{futuro.exception()}")
+                return
+        resultado_desmatamento_cv, area_pixels = futuro_desmatamento.result()
+        resultado_incendio_cv, num_focos = futuro_incendio.result()
+        self.finished.emit(resultado_desmatamento_cv, float(area_pixels), resultado_incendio_cv, num_focos)
+
+
 # ==============================================================================
 # CLASSE DA APLICAÇÃO (AJUSTADA PARA A LÓGICA MAIS SIMPLES)
 # ==============================================================================
 class DetectorApp(QWidget):
+    # Pede ao worker, na thread dele, que processe a imagem já carregada
+    processamento_solicitado = Signal(object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Detector de Desmatamento e Incêndio (PySide6)")
         self.setFixedSize(1200, 550)
         self.caminho_imagem = None
+        # Imagem decodificada na seleção e reaproveitada a cada processamento
+        self.imagem_original = None
         
         self.setStyleSheet("""
             QWidget {
@@ -168,17 +316,26 @@ class DetectorApp(QWidget):
         self.btn_selecionar.clicked.connect(self.selecionar_e_exibir_imagem)
         self.btn_processar.clicked.connect(self.processar_imagem)
 
+        # Detecção roda em uma QThread dedicada
+        self.worker_thread = QThread(self)
+        self.worker = DetectionWorker()
+        self.worker.moveToThread(self.worker_thread)
+        self.processamento_solicitado.connect(self.worker.run)
+        self.worker.finished.connect(self.exibir_resultados)
+        self.worker.erro.connect(self.exibir_erro_processamento)
+        self.worker_thread.start()
+
     def selecionar_e_exibir_imagem(self):
         caminho, _ = QFileDialog.getOpenFileName(self, "Selecionar Imagem", "", "Arquivos de Imagem (*.png *.jpg *.jpeg *.bmp)")
         if caminho:
             self.caminho_imagem = caminho
             self.lbl_caminho.setText(caminho)
-            self.btn_processar.setEnabled(True)
             self.limpar_resultados()
-            imagem_original_cv = cv2.imread(self.caminho_imagem)
-            if imagem_original_cv is not None:
-                pixmap_original = self.converter_cv2_para_qpixmap(imagem_original_cv)
-                self.lbl_img_original.setPixmap(pixmap_original.scaled(self.lbl_img_original.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            self.imagem_original = cv2.imread(self.caminho_imagem)
+            self.btn_processar.setEnabled(self.imagem_original is not None)
+            if self.imagem_original is not None:
+                pixmap_original = self.converter_cv2_para_qpixmap(self.imagem_original, self.lbl_img_original.size().toTuple())
+                self.lbl_img_original.setPixmap(pixmap_original)
             else:
                  QMessageBox.critical(self, "Erro", f"Não foi possível carregar a imagem em:\n{self.caminho_imagem}")
 
@@ -190,32 +347,56 @@ class DetectorApp(QWidget):
         self.lbl_resultado_incendio.clear()
 
     def processar_imagem(self):
-        if not self.caminho_imagem: return
-        imagem_original = cv2.imread(self.caminho_imagem)
-        if imagem_original is None:
-            QMessageBox.critical(self, "Erro", f"Não foi possível carregar a imagem em:\n{self.caminho_imagem}")
-            return
+        if self.imagem_original is None: return
+        # Botões ficam desabilitados até o worker terminar
+        self.btn_processar.setEnabled(False)
+        self.btn_selecionar.setEnabled(False)
+        self.processamento_solicitado.emit(self.imagem_original)
+
+    @Slot(str)
+    def exibir_erro_processamento(self, mensagem):
+        self.btn_processar.setEnabled(True)
+        self.btn_selecionar.setEnabled(True)
+        QMessageBox.critical(self, "Erro", mensagem)
+
+    @Slot(object, float, object, int)
+    def exibir_resultados(self, resultado_desmatamento_cv, area_pixels, resultado_incendio_cv, num_focos):
+        self.btn_processar.setEnabled(True)
+        self.btn_selecionar.setEnabled(True)
 
         # --- Processamento de Desmatamento ---
-        resultado_desmatamento_cv, area_pixels = detectar_desmatamento(imagem_original.copy())
         self.lbl_resultado_desmatamento.setText(f"<b>Área de Desmatamento:</b> {int(area_pixels)} pixels")
-        pixmap_desmatamento = self.converter_cv2_para_qpixmap(resultado_desmatamento_cv)
-        self.lbl_img_desmatamento.setPixmap(pixmap_desmatamento.scaled(self.lbl_img_desmatamento.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        pixmap_desmatamento = self.converter_cv2_para_qpixmap(resultado_desmatamento_cv, self.lbl_img_desmatamento.size().toTuple())
+        self.lbl_img_desmatamento.setPixmap(pixmap_desmatamento)
         
         # --- Processamento de Incêndio ---
-        # A chamada foi simplificada, não precisa mais da máscara de solo
-        resultado_incendio_cv, num_focos = detectar_focos_incendio(imagem_original.copy())
         self.lbl_resultado_incendio.setText(f"<b>Focos de Incêndio:</b> {num_focos}")
-        pixmap_incendio = self.converter_cv2_para_qpixmap(resultado_incendio_cv)
-        self.lbl_img_incendio.setPixmap(pixmap_incendio.scaled(self.lbl_img_incendio.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
-
-    def converter_cv2_para_qpixmap(self, imagem_cv):
-        imagem_rgb = cv2.cvtColor(imagem_cv, cv2.COLOR_BGR2RGB)
-        h, w, ch = imagem_rgb.shape
-        bytes_por_linha = ch * w
-        q_img = QImage(imagem_rgb.data, w, h, bytes_por_linha, QImage.Format_RGB888)
+        pixmap_incendio = self.converter_cv2_para_qpixmap(resultado_incendio_cv, self.lbl_img_incendio.size().toTuple())
+        self.lbl_img_incendio.setPixmap(pixmap_incendio)
+
+    def converter_cv2_para_qpixmap(self, imagem_cv, target_size=None):
+        # Com target_size (largura, altura), a imagem é redimensionada no OpenCV
+        # para caber no rótulo mantendo a proporção; assim o Qt recebe só a
+        # miniatura em vez da imagem em resolução cheia.
+        if target_size is not None:
+            h, w = imagem_cv.shape[:2]
+            fator = min(target_size[0] / w, target_size[1] / h)
+            tamanho = (max(1, int(w * fator)), max(1, int(h * fator)))
+            interpolacao = cv2.INTER_AREA if fator < 1 else cv2.INTER_LINEAR
+            imagem_cv = cv2.resize(imagem_cv, tamanho, interpolation=interpolacao)
+        # O QImage lê o BGR do OpenCV diretamente (Format_BGR888), sem conversão
+        # para RGB. QPixmap.fromImage copia os pixels antes de imagem_cv sair de escopo.
+        h, w = imagem_cv.shape[:2]
+        bytes_por_linha = imagem_cv.strides[0]
+        q_img = QImage(imagem_cv.data, w, h, bytes_por_linha, QImage.Format_BGR888)
         return QPixmap.fromImage(q_img)
 
+    def closeEvent(self, event):
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        self.worker.executor.shutdown()
+        super().closeEvent(event)
+
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     window = DetectorApp()